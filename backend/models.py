@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-import uuid
+import secrets
 from enum import Enum
+from time_cache import time_cache
 
 class PlayerStatus(str, Enum):
     CONNECTING = "connecting"
@@ -22,25 +23,38 @@ class LinkCableAction(str, Enum):
     SYNC_DATA = "sync_data"
 
 class Player(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: secrets.token_hex(16))
     name: str
     is_host: bool = False
     status: PlayerStatus = PlayerStatus.CONNECTING
     socket_id: Optional[str] = None
     rom_loaded: bool = False
     rom_name: Optional[str] = None
-    save_state: Optional[Dict[str, Any]] = None
-    joined_at: datetime = Field(default_factory=datetime.utcnow)
+    # Latest save state, kept out of room payloads
+    save_data: Optional[str] = Field(default=None, exclude=True)  # Base64 encoded save data
+    save_screenshot: Optional[str] = Field(default=None, exclude=True)  # Base64 encoded screenshot
+    save_timestamp: Optional[str] = Field(default=None, exclude=True)
+    joined_at: datetime = Field(default_factory=time_cache.now)
+    partner_id: Optional[str] = Field(default=None, exclude=True)  # Link cable partner, set by Room
+    partner_socket_id: Optional[str] = Field(default=None, exclude=True)  # Partner's socket, set by RoomManager
 
 class Room(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()).upper()[:6])
+    id: str = Field(default_factory=lambda: secrets.token_hex(3).upper())
     host_id: str
     players: List[Player] = []
     max_players: int = 2
     is_active: bool = True
     link_cable_connected: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    last_activity: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=time_cache.now)
+    last_activity: datetime = Field(default_factory=time_cache.now)
+
+    _players_by_id: Dict[str, Player] = PrivateAttr(default_factory=dict)  # player_id -> player
+    _snapshot: Optional[Dict[str, Any]] = PrivateAttr(default=None)  # Cached JSON-ready dump, None when dirty
+
+    def model_post_init(self, __context: Any) -> None:
+        self._players_by_id = {p.id: p for p in self.players}
+        if len(self.players) == 2:
+            self._link_partners()
 
     def add_player(self, player: Player) -> bool:
         if len(self.players) >= self.max_players:
@@ -51,17 +65,29 @@ class Room(BaseModel):
             self.host_id = player.id
         
         self.players.append(player)
-        self.last_activity = datetime.utcnow()
+        self._players_by_id[player.id] = player
+        self.touch()
         
         # Auto-connect link cable when we have 2 players
         if len(self.players) == 2:
             self.link_cable_connected = True
+            self._link_partners()
             
         return True
     
     def remove_player(self, player_id: str) -> bool:
-        self.players = [p for p in self.players if p.id != player_id]
-        self.last_activity = datetime.utcnow()
+        player = self._players_by_id.pop(player_id, None)
+        if player:
+            # Match by identity; list.remove would call BaseModel.__eq__ on every player
+            del self.players[next(i for i, p in enumerate(self.players) if p is player)]
+            if player.partner_id:
+                partner = self._players_by_id.get(player.partner_id)
+                if partner:
+                    partner.partner_id = None
+                    partner.partner_socket_id = None
+                player.partner_id = None
+                player.partner_socket_id = None
+        self.touch()
         
         # Disconnect link cable if less than 2 players
         if len(self.players) < 2:
@@ -75,19 +101,41 @@ class Room(BaseModel):
         return len(self.players) == 0  # Return True if room is empty
 
     def get_player(self, player_id: str) -> Optional[Player]:
-        return next((p for p in self.players if p.id == player_id), None)
+        return self._players_by_id.get(player_id)
+
+    def touch(self) -> None:
+        """Record activity on the room and invalidate the cached snapshot"""
+        self.last_activity = time_cache.now()
+        self._snapshot = None
+
+    def mark_dirty(self) -> None:
+        """Invalidate the cached snapshot after mutating the room or its players"""
+        self._snapshot = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready dump of the room, reused until the room is mutated"""
+        if self._snapshot is None:
+            self._snapshot = self.model_dump(mode='json')
+        return self._snapshot
+
+    def _link_partners(self) -> None:
+        first, second = self.players
+        first.partner_id = second.id
+        second.partner_id = first.id
+        first.partner_socket_id = second.socket_id
+        second.partner_socket_id = first.socket_id
 
 class LinkCableMessage(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: secrets.token_hex(16))
     room_id: str
     from_player_id: str
     to_player_id: Optional[str] = None  # None means broadcast to all
     action: LinkCableAction
     data: Dict[str, Any] = {}
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=time_cache.now)
 
 class SaveState(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: secrets.token_hex(16))
     player_id: str
     room_id: str
     game_data: str  # Base64 encoded save data
@@ -124,4 +172,4 @@ class RoomListResponse(BaseModel):
 class WebSocketMessage(BaseModel):
     type: str
     data: Dict[str, Any] = {}
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    timestamp: datetime = Field(default_factory=time_cache.now)
\ No newline at end of file
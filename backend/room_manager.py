@@ -1,17 +1,28 @@
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
 import asyncio
+import heapq
 import logging
+from sortedcontainers import SortedList
 from models import Room, Player, PlayerStatus, LinkCableMessage, LinkCableAction
 
 logger = logging.getLogger(__name__)
 
+ROOM_INACTIVITY_TIMEOUT = timedelta(hours=1)
+
 class RoomManager:
     def __init__(self):
         self.rooms: Dict[str, Room] = {}
         self.player_to_room: Dict[str, str] = {}  # player_id -> room_id
-        self.socket_to_player: Dict[str, str] = {}  # socket_id -> player_id
+        self.player_to_socket: Dict[str, str] = {}  # player_id -> socket_id
+        self.socket_to_context: Dict[str, Tuple[Room, Player]] = {}  # socket_id -> (room, player)
+        self._joinable_rooms: Set[str] = set()  # room_ids that can currently be joined
+        self._joinable_by_recency = SortedList()  # (-created_at timestamp, room_id) of joinable rooms, newest first
+        self._activity_heap: List[Tuple[datetime, str]] = []  # (last_activity, room_id) min-heap
         self._cleanup_task = None
+        self._write_queue: asyncio.Queue = asyncio.Queue()  # room_ids with a pending write
+        self._pending_writes: Dict[str, Callable[[], Awaitable[Any]]] = {}  # room_id -> latest write
+        self._write_task = None
         
     async def start_cleanup_task(self):
         """Start background task to clean up inactive rooms"""
@@ -28,22 +39,72 @@ class RoomManager:
                 pass
             self._cleanup_task = None
 
+    async def start_write_worker(self):
+        """Start background task that persists rooms to the database"""
+        if self._write_task is None:
+            self._write_task = asyncio.create_task(self._process_writes())
+    
+    async def stop_write_worker(self, timeout: float = 5.0):
+        """Flush pending writes, then stop the write worker"""
+        if self._write_task:
+            try:
+                await asyncio.wait_for(self._write_queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropped {len(self._pending_writes)} pending room writes on shutdown")
+            self._write_task.cancel()
+            try:
+                await self._write_task
+            except asyncio.CancelledError:
+                pass
+            self._write_task = None
+    
+    def schedule_write(self, room_id: str, write: Callable[[], Awaitable[Any]]):
+        """Queue a database write for a room, replacing any write for it not yet applied"""
+        if room_id not in self._pending_writes:
+            self._write_queue.put_nowait(room_id)
+        self._pending_writes[room_id] = write
+    
+    async def _process_writes(self):
+        """Apply queued room writes off the request path"""
+        while True:
+            room_id = await self._write_queue.get()
+            write = self._pending_writes.pop(room_id, None)
+            try:
+                if write:
+                    await write()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error persisting room {room_id}: {e}")
+            finally:
+                self._write_queue.task_done()
+
     async def _cleanup_inactive_rooms(self):
         """Clean up rooms that have been inactive for more than 1 hour"""
         while True:
             try:
-                cutoff_time = datetime.utcnow() - timedelta(hours=1)
-                rooms_to_remove = []
+                cutoff_time = datetime.utcnow() - ROOM_INACTIVITY_TIMEOUT
                 
-                for room_id, room in self.rooms.items():
+                # Entries hold the activity time seen when pushed; rooms that were
+                # active since then are pushed back with their current timestamp
+                while self._activity_heap and self._activity_heap[0][0] < cutoff_time:
+                    _, room_id = heapq.heappop(self._activity_heap)
+                    room = self.rooms.get(room_id)
+                    if not room:
+                        continue
+                    
                     if room.last_activity < cutoff_time or not room.is_active:
-                        rooms_to_remove.append(room_id)
-                
-                for room_id in rooms_to_remove:
-                    await self.remove_room(room_id)
-                    logger.info(f"Cleaned up inactive room: {room_id}")
+                        await self.remove_room(room_id)
+                        logger.info(f"Cleaned up inactive room: {room_id}")
+                    else:
+                        heapq.heappush(self._activity_heap, (room.last_activity, room_id))
                 
-                await asyncio.sleep(300)  # Check every 5 minutes
+                # Sleep until the oldest tracked room could expire
+                if self._activity_heap:
+                    delay = (self._activity_heap[0][0] - cutoff_time).total_seconds()
+                else:
+                    delay = ROOM_INACTIVITY_TIMEOUT.total_seconds()
+                await asyncio.sleep(delay)
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -62,7 +123,9 @@ class RoomManager:
         room.add_player(host)
         
         self.rooms[room.id] = room
+        self._update_joinable(room)
         self.player_to_room[host.id] = room.id
+        heapq.heappush(self._activity_heap, (room.last_activity, room.id))
         
         logger.info(f"Created room {room.id} with host {host_name}")
         return room, host
@@ -87,6 +150,7 @@ class RoomManager:
         
         if room.add_player(player):
             self.player_to_room[player.id] = room.id
+            self._update_joinable(room)
             logger.info(f"Player {player_name} joined room {room_id}")
             return room, player, "Successfully joined room"
         
@@ -110,15 +174,16 @@ class RoomManager:
         del self.player_to_room[player_id]
         
         # Remove socket mapping if exists
-        socket_id = next((sid for sid, pid in self.socket_to_player.items() if pid == player_id), None)
+        socket_id = self.player_to_socket.pop(player_id, None)
         if socket_id:
-            del self.socket_to_player[socket_id]
+            self.socket_to_context.pop(socket_id, None)
         
         if is_empty:
-            del self.rooms[room_id]
+            self._delete_room(room_id)
             logger.info(f"Removed empty room {room_id}")
             return None
         
+        self._update_joinable(room)
         return room
 
     def get_room(self, room_id: str) -> Optional[Room]:
@@ -132,14 +197,7 @@ class RoomManager:
 
     def get_available_rooms(self, limit: int = 10) -> List[Room]:
         """Get list of available rooms that can be joined"""
-        available = []
-        for room in self.rooms.values():
-            if room.is_active and len(room.players) < room.max_players:
-                available.append(room)
-        
-        # Sort by creation time, newest first
-        available.sort(key=lambda r: r.created_at, reverse=True)
-        return available[:limit]
+        return [self.rooms[room_id] for _, room_id in self._joinable_by_recency.islice(0, limit)]
 
     def update_player_status(self, player_id: str, status: PlayerStatus) -> bool:
         """Update a player's status"""
@@ -152,7 +210,7 @@ class RoomManager:
             return False
         
         player.status = status
-        room.last_activity = datetime.utcnow()
+        room.touch()
         return True
 
     def connect_socket(self, socket_id: str, player_id: str) -> bool:
@@ -165,50 +223,50 @@ class RoomManager:
         if not player:
             return False
         
-        self.socket_to_player[socket_id] = player_id
+        # Drop a stale mapping if the player reconnects on a new socket
+        old_socket_id = self.player_to_socket.get(player_id)
+        if old_socket_id and old_socket_id != socket_id:
+            self.socket_to_context.pop(old_socket_id, None)
+        
+        self.player_to_socket[player_id] = socket_id
+        self.socket_to_context[socket_id] = (room, player)
         player.socket_id = socket_id
         player.status = PlayerStatus.CONNECTED
-        room.last_activity = datetime.utcnow()
+        room.touch()
         
-        logger.info(f"Connected socket {socket_id} to player {player.name}")
+        # Cross-link sockets so link cable data can be forwarded without lookups
+        partner = room.get_player(player.partner_id) if player.partner_id else None
+        if partner:
+            player.partner_socket_id = partner.socket_id
+            partner.partner_socket_id = socket_id
+        
+        logger.debug("Connected socket %s to player %s", socket_id, player.name)
         return True
 
     def disconnect_socket(self, socket_id: str) -> Optional[tuple[Room, Player]]:
         """Disconnect a socket and update player status"""
-        player_id = self.socket_to_player.get(socket_id)
-        if not player_id:
+        context = self.socket_to_context.pop(socket_id, None)
+        if not context:
             return None
         
-        room = self.get_player_room(player_id)
-        if not room:
-            return None
-        
-        player = room.get_player(player_id)
-        if not player:
-            return None
+        room, player = context
         
         player.socket_id = None
         player.status = PlayerStatus.DISCONNECTED
-        del self.socket_to_player[socket_id]
+        room.mark_dirty()
+        
+        partner = room.get_player(player.partner_id) if player.partner_id else None
+        if partner:
+            partner.partner_socket_id = None
+        
+        self.player_to_socket.pop(player.id, None)
         
-        logger.info(f"Disconnected socket {socket_id} from player {player.name}")
+        logger.debug("Disconnected socket %s from player %s", socket_id, player.name)
         return room, player
 
     def get_player_by_socket(self, socket_id: str) -> Optional[tuple[Room, Player]]:
         """Get room and player by socket ID"""
-        player_id = self.socket_to_player.get(socket_id)
-        if not player_id:
-            return None
-        
-        room = self.get_player_room(player_id)
-        if not room:
-            return None
-        
-        player = room.get_player(player_id)
-        if not player:
-            return None
-        
-        return room, player
+        return self.socket_to_context.get(socket_id)
 
     async def remove_room(self, room_id: str):
         """Manually remove a room and clean up all associated data"""
@@ -221,8 +279,27 @@ class RoomManager:
             self.leave_room(player.id)
         
         # Remove the room
-        if room_id in self.rooms:
-            del self.rooms[room_id]
+        self._delete_room(room_id)
+
+    def _delete_room(self, room_id: str):
+        """Drop a room and its index entries"""
+        room = self.rooms.pop(room_id, None)
+        if room:
+            self._update_joinable(room)
+
+    def _update_joinable(self, room: Room):
+        """Sync the joinable-room index after a room gains or loses players"""
+        joinable = room.id in self.rooms and room.is_active and len(room.players) < room.max_players
+        if joinable == (room.id in self._joinable_rooms):
+            return
+        
+        key = (-room.created_at.timestamp(), room.id)
+        if joinable:
+            self._joinable_rooms.add(room.id)
+            self._joinable_by_recency.add(key)
+        else:
+            self._joinable_rooms.discard(room.id)
+            self._joinable_by_recency.discard(key)
 
 # Global room manager instance
 room_manager = RoomManager()
\ No newline at end of file
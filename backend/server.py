@@ -5,12 +5,13 @@ from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+from functools import partial
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List
 import uuid
 from datetime import datetime
-import json
+import orjson
 
 # Import our new modules
 import sys
@@ -23,6 +24,7 @@ from models import (
 )
 from room_manager import room_manager
 from websocket_handler import websocket_manager
+from time_cache import time_cache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -41,12 +43,16 @@ api_router = APIRouter(prefix="/api")
 # Startup event to initialize room manager
 @app.on_event("startup")
 async def startup_event():
+    await time_cache.start()
     await room_manager.start_cleanup_task()
-    logger.info("Room manager cleanup task started")
+    await room_manager.start_write_worker()
+    logger.info("Room manager background tasks started")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     await room_manager.stop_cleanup_task()
+    await room_manager.stop_write_worker()
+    await time_cache.stop()
     client.close()
     logger.info("Application shutdown completed")
 
@@ -73,8 +79,10 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    # Documents were written from StatusCheck, so skip re-validating them
+    cursor = db.status_checks.find({}, {"_id": 0}).batch_size(500)
+    status_checks = await cursor.to_list(1000)
+    return [StatusCheck.model_construct(**status_check) for status_check in status_checks]
 
 # New multiplayer routes
 @api_router.post("/rooms", response_model=CreateRoomResponse)
@@ -83,9 +91,9 @@ async def create_room(request: CreateRoomRequest):
     try:
         room, host = room_manager.create_room(request.player_name, request.rom_name)
         
-        # Store room in database
+        # Store room in database in the background
         room_doc = room.dict()
-        await db.rooms.insert_one(room_doc)
+        room_manager.schedule_write(room.id, partial(db.rooms.replace_one, {"id": room.id}, room_doc, upsert=True))
         
         return CreateRoomResponse(
             success=True,
@@ -108,12 +116,9 @@ async def join_room(request: JoinRoomRequest):
         )
         
         if room and player:
-            # Update room in database
+            # Update room in database in the background
             room_doc = room.dict()
-            await db.rooms.update_one(
-                {"id": room.id},
-                {"$set": room_doc}
-            )
+            room_manager.schedule_write(room.id, partial(db.rooms.replace_one, {"id": room.id}, room_doc, upsert=True))
             
             return JoinRoomResponse(
                 success=True,
@@ -160,8 +165,8 @@ async def delete_room(room_id: str):
     try:
         await room_manager.remove_room(room_id)
         
-        # Remove from database
-        await db.rooms.delete_one({"id": room_id})
+        # Remove from database; queued so it cannot race an earlier pending write
+        room_manager.schedule_write(room_id, partial(db.rooms.delete_one, {"id": room_id}))
         
         return {"success": True, "message": "Room deleted successfully"}
     except Exception as e:
@@ -176,15 +181,18 @@ async def websocket_endpoint(websocket: WebSocket, socket_id: str):
     
     try:
         while True:
-            # Receive message from client
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            # Receive message from client; clients send binary frames, text is still accepted
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = message.get("bytes")
+            message_data = orjson.loads(data if data is not None else message["text"])
             
             # Handle the message
             await websocket_manager.handle_message(socket_id, message_data)
             
     except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected: {socket_id}")
+        logger.debug("WebSocket disconnected: %s", socket_id)
     except Exception as e:
         logger.error(f"WebSocket error for {socket_id}: {e}")
     finally:
@@ -199,7 +207,7 @@ async def websocket_endpoint(websocket: WebSocket, socket_id: str):
                     'type': 'player_disconnected',
                     'data': {
                         'player_name': player.name,
-                        'room': room.dict(),
+                        'room': room.snapshot(),
                         'message': f'{player.name} has disconnected'
                     }
                 }, exclude_socket=socket_id)
@@ -216,8 +224,9 @@ app.add_middleware(
 )
 
 # Configure logging
+# Per-message logs are DEBUG; set LOG_LEVEL=WARNING in production to keep only problems
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -0,0 +1,40 @@
+from datetime import datetime
+import asyncio
+
+class TimeCache:
+    """Coarse utcnow() for hot paths, refreshed by a background task"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval  # seconds between refreshes
+        self._now = datetime.utcnow()
+        self._task = None
+
+    def now(self) -> datetime:
+        """Current UTC time, at most `interval` seconds stale while the refresher runs"""
+        if self._task is None:
+            return datetime.utcnow()
+        return self._now
+
+    async def start(self):
+        """Start the background refresh task"""
+        if self._task is None:
+            self._now = datetime.utcnow()
+            self._task = asyncio.create_task(self._refresh())
+
+    async def stop(self):
+        """Stop the refresh task; now() falls back to datetime.utcnow()"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh(self):
+        while True:
+            self._now = datetime.utcnow()
+            await asyncio.sleep(self.interval)
+
+# Global time cache instance
+time_cache = TimeCache()
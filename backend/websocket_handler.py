@@ -1,53 +1,172 @@
-import json
+import asyncio
 import logging
-from typing import Dict, Any
+import orjson
+from typing import Dict, Any, List, Optional, Set, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 from models import WebSocketMessage, LinkCableMessage, LinkCableAction, PlayerStatus
 from room_manager import room_manager
 
 logger = logging.getLogger(__name__)
 
+_STATUS_BY_VALUE = {s.value: s for s in PlayerStatus}
+
+SEND_TIMEOUT = 1.0  # seconds before a slow recipient is dropped from a broadcast
+
+class LinkCableAggregator:
+    """Batch link cable frames per recipient over a short window to cut per-frame overhead"""
+    
+    FLUSH_DELAY = 0.004  # seconds
+    IMMEDIATE_ACTIONS = {LinkCableAction.BATTLE_START.value, LinkCableAction.TRADE_COMPLETE.value}
+    
+    def __init__(self, manager: "WebSocketManager"):
+        self.manager = manager
+        self.pending: Dict[str, List[Dict[str, Any]]] = {}  # socket_id -> queued link cable data
+        self._timers: Dict[str, asyncio.TimerHandle] = {}  # socket_id -> armed flush timer
+        self._sends: Dict[str, asyncio.Task] = {}  # socket_id -> latest send, each send waits for the one before
+    
+    async def forward(self, socket_id: str, item: Dict[str, Any], flush_immediate: bool = False):
+        """Queue link cable data for a socket, or send it right away with anything already queued"""
+        if flush_immediate:
+            self._cancel_timer(socket_id)
+            items = self.pending.pop(socket_id, [])
+            items.append(item)
+            await self._schedule_send(socket_id, items)
+            return
+        
+        self.pending.setdefault(socket_id, []).append(item)
+        if socket_id not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[socket_id] = loop.call_later(self.FLUSH_DELAY, self._flush, socket_id)
+    
+    def discard(self, socket_id: str):
+        """Drop queued data for a socket that went away"""
+        self._cancel_timer(socket_id)
+        self.pending.pop(socket_id, None)
+    
+    def _cancel_timer(self, socket_id: str):
+        timer = self._timers.pop(socket_id, None)
+        if timer:
+            timer.cancel()
+    
+    def _flush(self, socket_id: str):
+        self._timers.pop(socket_id, None)
+        items = self.pending.pop(socket_id, None)
+        if items:
+            self._schedule_send(socket_id, items)
+    
+    def _schedule_send(self, socket_id: str, items: List[Dict[str, Any]]) -> asyncio.Task:
+        """Chain a send behind any earlier send to the same socket so frames keep their order"""
+        previous = self._sends.get(socket_id)
+        task = asyncio.create_task(self._send_after(previous, socket_id, items))
+        self._sends[socket_id] = task
+        
+        def _forget(done: asyncio.Task):
+            if self._sends.get(socket_id) is done:
+                del self._sends[socket_id]
+        
+        task.add_done_callback(_forget)
+        return task
+    
+    async def _send_after(self, previous: Optional[asyncio.Task], socket_id: str, items: List[Dict[str, Any]]):
+        if previous:
+            await asyncio.wait([previous])
+        await self._send(socket_id, items)
+    
+    async def _send(self, socket_id: str, items: List[Dict[str, Any]]):
+        if len(items) == 1:
+            await self.manager.send_message(socket_id, {'type': 'link_cable_data', 'data': items[0]})
+        else:
+            await self.manager.send_message(socket_id, {
+                'type': 'link_cable_data_batch',
+                'data': {'items': items}
+            })
+
 class WebSocketManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}  # socket_id -> websocket
+        self.link_cable = LinkCableAggregator(self)
+        self._close_tasks: Set[asyncio.Task] = set()
         
     async def connect(self, websocket: WebSocket, socket_id: str):
         """Accept a WebSocket connection"""
         await websocket.accept()
         self.active_connections[socket_id] = websocket
-        logger.info(f"WebSocket connected: {socket_id}")
+        logger.debug("WebSocket connected: %s", socket_id)
     
     def disconnect(self, socket_id: str):
         """Remove a WebSocket connection"""
         if socket_id in self.active_connections:
             del self.active_connections[socket_id]
-            logger.info(f"WebSocket disconnected: {socket_id}")
+            self.link_cable.discard(socket_id)
+            logger.debug("WebSocket disconnected: %s", socket_id)
     
     async def send_message(self, socket_id: str, message: Dict[str, Any]):
         """Send a message to a specific socket"""
+        return await self._send_payload(socket_id, orjson.dumps(message))
+    
+    async def _send_payload(self, socket_id: str, payload: bytes):
+        """Send an already encoded message to a specific socket"""
         websocket = self.active_connections.get(socket_id)
         if websocket:
             try:
-                await websocket.send_text(json.dumps(message))
+                await websocket.send_bytes(payload)
                 return True
             except Exception as e:
                 logger.error(f"Error sending message to {socket_id}: {e}")
                 self.disconnect(socket_id)
         return False
     
-    async def broadcast_to_room(self, room_id: str, message: Dict[str, Any], exclude_socket: str = None):
-        """Send a message to all players in a room"""
+    async def _send_with_timeout(self, socket_id: str, payload: bytes) -> bool:
+        """Send an encoded message, closing the socket if it is too slow or broken"""
+        websocket = self.active_connections.get(socket_id)
+        if not websocket:
+            return False
+        
+        try:
+            await asyncio.wait_for(websocket.send_bytes(payload), timeout=SEND_TIMEOUT)
+            return True
+        except (asyncio.TimeoutError, WebSocketDisconnect) as e:
+            logger.debug("Dropping socket %s after failed broadcast: %r", socket_id, e)
+        except Exception as e:
+            logger.error(f"Error sending message to {socket_id}: {e}")
+        
+        # Close in the background so the broadcast is not held up; the endpoint's
+        # receive loop then ends and its cleanup notifies the rest of the room
+        self.disconnect(socket_id)
+        task = asyncio.create_task(self._close(socket_id, websocket))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+        return False
+    
+    async def _close(self, socket_id: str, websocket: WebSocket):
+        """Close a dropped socket, giving up if the client does not respond"""
+        try:
+            await asyncio.wait_for(websocket.close(code=1011), timeout=SEND_TIMEOUT)
+        except Exception as e:
+            logger.debug("Failed to close socket %s: %r", socket_id, e)
+    
+    async def broadcast_to_room(self, room_id: str, message: Dict[str, Any], exclude_socket: str = None) -> Tuple[List[str], List[str]]:
+        """Send a message to all players in a room, returning (successful, failed) socket IDs"""
         room = room_manager.get_room(room_id)
         if not room:
-            return
+            return [], []
+        
+        # Encode once and reuse the same payload for every recipient
+        payload = orjson.dumps(message)
+        recipients = [
+            player.socket_id for player in room.players
+            if player.socket_id and player.socket_id != exclude_socket
+        ]
         
-        sent_count = 0
-        for player in room.players:
-            if player.socket_id and player.socket_id != exclude_socket:
-                if await self.send_message(player.socket_id, message):
-                    sent_count += 1
+        # Write to all recipients concurrently; a slow client cannot hold up the others
+        async with asyncio.TaskGroup() as tg:
+            sends = {socket_id: tg.create_task(self._send_with_timeout(socket_id, payload)) for socket_id in recipients}
         
-        logger.info(f"Broadcasted message to {sent_count} players in room {room_id}")
+        successful = [socket_id for socket_id, task in sends.items() if task.result()]
+        failed = [socket_id for socket_id, task in sends.items() if not task.result()]
+        
+        logger.debug("Broadcasted message to %s players in room %s", len(successful), room_id)
+        return successful, failed
     
     async def handle_message(self, socket_id: str, message_data: Dict[str, Any]):
         """Handle incoming WebSocket message"""
@@ -55,7 +174,7 @@ class WebSocketManager:
             message_type = message_data.get('type')
             data = message_data.get('data', {})
             
-            logger.info(f"Received message from {socket_id}: {message_type}")
+            logger.debug("Received message from %s: %s", socket_id, message_type)
             
             if message_type == 'join_room':
                 await self._handle_join_room(socket_id, data)
@@ -93,11 +212,13 @@ class WebSocketManager:
         if room_manager.connect_socket(socket_id, player_id):
             room_data = room_manager.get_player_room(player_id)
             if room_data:
+                room_dict = room_data.snapshot()
+                
                 # Notify other players in the room
                 await self.broadcast_to_room(room_data.id, {
                     'type': 'player_joined',
                     'data': {
-                        'room': room_data.dict(),
+                        'room': room_dict,
                         'message': 'A player has connected'
                     }
                 }, exclude_socket=socket_id)
@@ -106,7 +227,7 @@ class WebSocketManager:
                 await self.send_message(socket_id, {
                     'type': 'room_joined',
                     'data': {
-                        'room': room_data.dict(),
+                        'room': room_dict,
                         'message': 'Successfully connected to room'
                     }
                 })
@@ -125,7 +246,7 @@ class WebSocketManager:
                 await self.broadcast_to_room(room.id, {
                     'type': 'player_left',
                     'data': {
-                        'room': room.dict(),
+                        'room': room.snapshot(),
                         'player_name': player.name,
                         'message': f'{player.name} has left the room'
                     }
@@ -146,14 +267,9 @@ class WebSocketManager:
             })
             return
         
-        # Find the other player in the room
-        other_player = None
-        for player in room.players:
-            if player.id != sender.id and player.socket_id:
-                other_player = player
-                break
+        partner_socket_id = sender.partner_socket_id
         
-        if not other_player:
+        if not partner_socket_id:
             await self.send_message(socket_id, {
                 'type': 'error',
                 'data': {'message': 'No other player connected'}
@@ -161,18 +277,20 @@ class WebSocketManager:
             return
         
         # Forward the link cable data to the other player
-        link_message = {
-            'type': 'link_cable_data',
-            'data': {
-                'action': data.get('action'),
-                'payload': data.get('payload', {}),
-                'from_player': sender.name,
-                'timestamp': data.get('timestamp')
-            }
+        action = data.get('action')
+        link_data = {
+            'action': action,
+            'payload': data.get('payload', {}),
+            'from_player': sender.name,
+            'timestamp': data.get('timestamp')
         }
         
-        await self.send_message(other_player.socket_id, link_message)
-        logger.info(f"Forwarded link cable data from {sender.name} to {other_player.name}")
+        await self.link_cable.forward(
+            partner_socket_id,
+            link_data,
+            flush_immediate=action in LinkCableAggregator.IMMEDIATE_ACTIONS
+        )
+        logger.debug("Forwarded link cable data from %s to socket %s", sender.name, partner_socket_id)
     
     async def _handle_player_status(self, socket_id: str, data: Dict[str, Any]):
         """Handle player status updates"""
@@ -183,8 +301,8 @@ class WebSocketManager:
         room, player = result
         status = data.get('status')
         
-        if status and hasattr(PlayerStatus, status.upper()):
-            new_status = PlayerStatus(status.lower())
+        new_status = _STATUS_BY_VALUE.get(status.lower()) if isinstance(status, str) else None
+        if new_status:
             if room_manager.update_player_status(player.id, new_status):
                 # Broadcast status update to room
                 await self.broadcast_to_room(room.id, {
@@ -193,7 +311,7 @@ class WebSocketManager:
                         'player_id': player.id,
                         'player_name': player.name,
                         'status': status,
-                        'room': room.dict()
+                        'room': room.snapshot()
                     }
                 })
     
@@ -208,11 +326,9 @@ class WebSocketManager:
         
         if action == 'save':
             # Store save state data (in a real implementation, this would go to database)
-            player.save_state = {
-                'data': data.get('save_data'),
-                'screenshot': data.get('screenshot'),
-                'timestamp': data.get('timestamp')
-            }
+            player.save_data = data.get('save_data')
+            player.save_screenshot = data.get('screenshot')
+            player.save_timestamp = data.get('timestamp')
             
             await self.send_message(socket_id, {
                 'type': 'save_state_response',
@@ -224,13 +340,13 @@ class WebSocketManager:
             })
         
         elif action == 'load':
-            if player.save_state:
+            if player.save_data:
                 await self.send_message(socket_id, {
                     'type': 'save_state_response',
                     'data': {
                         'action': 'load',
                         'success': True,
-                        'save_data': player.save_state.get('data'),
+                        'save_data': player.save_data,
                         'message': 'Game state loaded successfully'
                     }
                 })
@@ -9,6 +9,8 @@ class WebSocketService {
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 5;
     this.reconnectDelay = 1000;
+    this.encoder = new TextEncoder();
+    this.decoder = new TextDecoder();
   }
 
   // Generate a unique socket ID
@@ -31,6 +33,7 @@ class WebSocketService {
         console.log('Connecting to WebSocket:', wsEndpoint);
         
         this.ws = new WebSocket(wsEndpoint);
+        this.ws.binaryType = 'arraybuffer';
         
         this.ws.onopen = () => {
           console.log('WebSocket connected');
@@ -45,7 +48,9 @@ class WebSocketService {
         
         this.ws.onmessage = (event) => {
           try {
-            const message = JSON.parse(event.data);
+            // The server sends UTF-8 JSON in binary frames
+            const text = typeof event.data === 'string' ? event.data : this.decoder.decode(event.data);
+            const message = JSON.parse(text);
             this.handleMessage(message);
           } catch (error) {
             console.error('Error parsing WebSocket message:', error);
@@ -119,7 +124,7 @@ class WebSocketService {
     };
     
     try {
-      this.ws.send(JSON.stringify(message));
+      this.ws.send(this.encoder.encode(JSON.stringify(message)));
       return true;
     } catch (error) {
       console.error('Error sending WebSocket message:', error);
@@ -131,6 +136,12 @@ class WebSocketService {
   handleMessage(message) {
     const { type, data } = message;
     
+    // Link cable frames may arrive batched; deliver them one by one
+    if (type === 'link_cable_data_batch') {
+      (data.items || []).forEach(item => this.handleMessage({ type: 'link_cable_data', data: item }));
+      return;
+    }
+    
     console.log('Received WebSocket message:', type, data);
     
     // Call registered handlers